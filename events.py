@@ -6,150 +6,192 @@ by artist, venue, or location with ticket availability.
 """
 
 import os
-import json
-from typing import Dict, Any, List, Optional
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Final, List, Optional
 from datetime import datetime
 import httpx
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
 
 # Load environment variables
 load_dotenv()
 
-# Initialize FastMCP server
-mcp = FastMCP("Local Events Assistant")
-
-# Constants
-TICKETMASTER_API_KEY = os.getenv("TICKETMASTER_API_KEY")
-TICKETMASTER_API_BASE = "https://app.ticketmaster.com/discovery/v2"
+# Constants (read once at import and baked into the shared client below)
+TICKETMASTER_API_KEY: Final[str] = os.getenv("TICKETMASTER_API_KEY", "")
+TICKETMASTER_API_BASE: Final[str] = "https://app.ticketmaster.com/discovery/v2"
 
 if not TICKETMASTER_API_KEY:
     raise ValueError("TICKETMASTER_API_KEY not found in environment variables")
 
+# Upper bound on results per search, regardless of what the client asks for
+try:
+    _max_size = int(os.getenv("TM_MAX_SIZE", "20"))
+except ValueError:
+    raise ValueError("TM_MAX_SIZE must be an integer") from None
+_MAX_SIZE: Final[int] = max(1, _max_size)
+
+# Display labels for Ticketmaster event status codes
+_STATUS_LABELS = {
+    "onsale": "On Sale",
+    "offsale": "Off Sale",
+    "cancelled": "Cancelled",
+    "postponed": "Postponed",
+    "rescheduled": "Rescheduled",
+}
+
+# Venue and classification fields shown by format_event, in display order
+_LOCATION_KEYS = ("city", "state", "country")
+_CLASSIFICATION_KEYS = ("segment", "genre", "subGenre")
+
+# Layout for format_event; each section placeholder already carries its trailing newline
+_EVENT_TEMPLATE = "\nEvent: {name}\n{date}{venue}{genre}{price}{ticket}{url}\n"
+
+# Shared HTTP client so connections (and TLS sessions) are reused across tool calls;
+# created lazily by get_client() and closed once the last server session ends
+_client: Optional[httpx.AsyncClient] = None
+_active_sessions = 0
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client, (re)creating it if needed."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=TICKETMASTER_API_BASE,
+            # The API key is merged into every request's query string by httpx
+            params={"apikey": TICKETMASTER_API_KEY},
+            # Compressed JSON is much smaller on the wire; httpx decodes br via the brotli package
+            headers={"Accept-Encoding": "gzip, br"},
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        )
+    return _client
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Close the shared HTTP client when the last active session ends.
+
+    FastMCP runs the lifespan once per session (e.g. per SSE connection),
+    so sessions are counted rather than closing the client on every exit.
+    """
+    global _active_sessions
+    _active_sessions += 1
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0 and _client is not None:
+            await _client.aclose()
+
+# Short-lived cache of successful API responses, keyed on endpoint and query params
+_cache: TTLCache = TTLCache(maxsize=512, ttl=60)
+
+# Initialize FastMCP server
+mcp = FastMCP("Local Events Assistant", lifespan=lifespan)
+
 async def make_ticketmaster_request(endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
     """Make a request to the Ticketmaster API with proper error handling."""
 
-    # Add API key to parameters
-    params["apikey"] = TICKETMASTER_API_KEY
-    url = f"{TICKETMASTER_API_BASE}/{endpoint}"
-    
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params, timeout=30.0)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429:
-                return {"error": "Rate limit exceeded. Please try again later."}
-            elif e.response.status_code == 401:
-                return {"error": "Unauthorized. Please check your API key."}
-            else:
-                return {"error": f"HTTP error: {e.response.status_code}"}
-        except httpx.RequestError:
-            return {"error": "Failed to connect to Ticketmaster API."}
-        except Exception as e:
-            return {"error": f"An unexpected error occurred: {str(e)}"}
+    # Serve repeated queries (including event lookups by ID) from the cache
+    key = (endpoint, tuple(sorted(params.items())))
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await get_client().get(endpoint, params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        if "error" not in data:
+            _cache[key] = data
+        return data
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 429:
+            return {"error": "Rate limit exceeded. Please try again later."}
+        elif e.response.status_code == 401:
+            return {"error": "Unauthorized. Please check your API key."}
+        else:
+            return {"error": f"HTTP error: {e.response.status_code}"}
+    except httpx.RequestError:
+        return {"error": "Failed to connect to Ticketmaster API."}
+    except Exception as e:
+        return {"error": f"An unexpected error occurred: {str(e)}"}
         
 def format_event(event: Dict[str, Any]) -> str:
     """Format an event into a readable string."""
     name = event.get("name", "Unknown Event")
+    dates = event.get("dates") or {}
+    start = dates.get("start") or {}
+    status = dates.get("status") or {}
+    embedded = event.get("_embedded") or {}
+    venues = embedded.get("venues") or ()
+    classifications = event.get("classifications") or ()
+    price_ranges = event.get("priceRanges") or ()
+    fields = {"name": name}
     
     # Format date
-    date_info = ""
-    if "dates" in event and "start" in event["dates"]:
-        start_date = event["dates"]["start"]
-        if "localDate" in start_date:
-            date = start_date["localDate"]
-            if "localTime" in start_date:
-                date += f" {start_date['localTime']}"
-            date_info = f"Date: {date}\n"
+    date = start.get("localDate")
+    if date:
+        local_time = start.get("localTime")
+        if local_time:
+            date += f" {local_time}"
+        fields["date"] = f"Date: {date}\n"
     
     # Format venue
-    venue_info = ""
-    if "embedded" in event and "_embedded" in event["embedded"] and "venues" in event["embedded"]["_embedded"]:
-        venues = event["embedded"]["_embedded"]["venues"]
-        if venues and len(venues) > 0:
-            venue = venues[0]
-            venue_name = venue.get("name", "Unknown Venue")
-            city = venue.get("city", {}).get("name", "")
-            state = venue.get("state", {}).get("name", "")
-            country = venue.get("country", {}).get("name", "")
-            location = ", ".join([part for part in [city, state, country] if part])
-            venue_info = f"Venue: {venue_name}, {location}\n"
+    if venues:
+        venue = venues[0]
+        venue_name = venue.get("name", "Unknown Venue")
+        names = ((venue.get(key) or {}).get("name") for key in _LOCATION_KEYS)
+        location = ", ".join(name for name in names if name)
+        if location:
+            fields["venue"] = f"Venue: {venue_name}, {location}\n"
+        else:
+            fields["venue"] = f"Venue: {venue_name}\n"
+    
+    # Format genre
+    if classifications:
+        classification = classifications[0]
+        names = ((classification.get(key) or {}).get("name") for key in _CLASSIFICATION_KEYS)
+        segments = " | ".join(name for name in names if name and name.lower() != "undefined")
+        
+        if segments:
+            fields["genre"] = f"Genre: {segments}\n"
     
     # Format pricing
-    price_info = ""
-    if "priceRanges" in event:
-        price_ranges = event["priceRanges"]
-        if price_ranges and len(price_ranges) > 0:
-            min_price = price_ranges[0].get("min")
-            max_price = price_ranges[0].get("max")
-            currency = price_ranges[0].get("currency", "USD")
-            if min_price and max_price:
-                price_info = f"Price Range: {min_price}-{max_price} {currency}\n"
-            elif min_price:
-                price_info = f"Starting Price: {min_price} {currency}\n"
+    if price_ranges:
+        price_range = price_ranges[0]
+        min_price = price_range.get("min")
+        max_price = price_range.get("max")
+        currency = price_range.get("currency", "USD")
+        if min_price and max_price:
+            fields["price"] = f"Price Range: {min_price}-{max_price} {currency}\n"
+        elif min_price:
+            fields["price"] = f"Starting Price: {min_price} {currency}\n"
     
     # Format ticket status
-    ticket_info = ""
-    if "dates" in event and "status" in event["dates"]:
-        status = event["dates"]["status"]
-        status_code = status.get("code", "")
-        if status_code == "onsale":
-            ticket_info = "Ticket Status: On Sale\n"
-        elif status_code == "offsale":
-            ticket_info = "Ticket Status: Off Sale\n"
-        elif status_code == "cancelled":
-            ticket_info = "Ticket Status: Cancelled\n"
-        elif status_code == "postponed":
-            ticket_info = "Ticket Status: Postponed\n"
-        elif status_code == "rescheduled":
-            ticket_info = "Ticket Status: Rescheduled\n"
+    label = _STATUS_LABELS.get(status.get("code", ""))
+    if label:
+        fields["ticket"] = f"Ticket Status: {label}\n"
     
     # Format URL
-    url_info = ""
     if "url" in event:
-        url_info = f"Tickets: {event['url']}\n"
+        fields["url"] = f"Tickets: {event['url']}\n"
     
-    # Format genre
-    genre_info = ""
-    if "classifications" in event and event["classifications"]:
-        classification = event["classifications"][0]
-        segments = []
-        
-        if "segment" in classification and classification["segment"]:
-            segment_name = classification["segment"].get("name")
-            if segment_name and segment_name.lower() != "undefined":
-                segments.append(segment_name)
-                
-        if "genre" in classification and classification["genre"]:
-            genre_name = classification["genre"].get("name")
-            if genre_name and genre_name.lower() != "undefined":
-                segments.append(genre_name)
-                
-        if "subGenre" in classification and classification["subGenre"]:
-            subgenre_name = classification["subGenre"].get("name")
-            if subgenre_name and subgenre_name.lower() != "undefined":
-                segments.append(subgenre_name)
-                
-        if segments:
-            genre_info = f"Genre: {' | '.join(segments)}\n"
-    
-    # Build the formatted event string
-    return f"""
-Event: {name}
-{date_info}{venue_info}{genre_info}{price_info}{ticket_info}{url_info}
-"""
+    # Build the formatted event string; missing sections render as empty
+    return _EVENT_TEMPLATE.format_map(defaultdict(str, fields))
+
+def clamp_size(size: int) -> int:
+    """Clamp a requested result count to between 1 and the configured maximum."""
+    return min(max(1, size), _MAX_SIZE)
 
 def extract_events(data: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Extract events from the API response."""
-    events = []
-    
-    # Check if the response contains the embedded section with events
-    if "_embedded" in data and "events" in data["_embedded"]:
-        events = data["_embedded"]["events"]
-    
-    return events
+    # Responses without matches omit the embedded section entirely
+    return (data.get("_embedded") or {}).get("events") or []
 
 # MCP Tools
 @mcp.tool()
@@ -158,11 +200,12 @@ async def search_events_by_artist(artist: str, size: int = 5) -> str:
 
     Args:
         artist: Name of the artist or performer
-        size: Number of results to return (default: 5)
+        size: Number of results to return (default: 5; capped at the server maximum, 20 unless configured)
     """
+    # Normalize the keyword so equivalent searches share a cache entry
     params = {
-        "keyword": artist,
-        "size": size,
+        "keyword": artist.strip().lower(),
+        "size": clamp_size(size),
         "sort": "date,asc"
     }
     
@@ -186,17 +229,20 @@ async def search_events_by_venue(venue: str, size: int = 5) -> str:
 
     Args:
         venue: Name of the venue
-        size: Number of results to return (default: 5)
+        size: Number of results to return (default: 5; capped at the server maximum, 20 unless configured)
     """
     params = {
-        "venueId": venue if venue.startswith("KovZ") else None,
-        "keyword": None if venue.startswith("KovZ") else venue,
-        "size": size,
+        "size": clamp_size(size),
         "sort": "date,asc"
     }
     
-    # Remove None values
-    params = {k: v for k, v in params.items() if v is not None}
+    # Ticketmaster venue IDs start with "KovZ"; anything else is a name search
+    # (IDs are case-sensitive, so only names are lowercased for cache reuse)
+    query = venue.strip()
+    if query.startswith("KovZ"):
+        params["venueId"] = query
+    else:
+        params["keyword"] = query.lower()
     
     data = await make_ticketmaster_request("events.json", params)
     
@@ -220,7 +266,7 @@ async def search_events_by_location(city: str, state: Optional[str] = None, coun
         city: City name
         state: State code (optional, for US locations)
         country: Country code (default: US)
-        size: Number of results to return (default: 5)
+        size: Number of results to return (default: 5; capped at the server maximum, 20 unless configured)
     """
     # Build the location string
     location = city
@@ -229,14 +275,12 @@ async def search_events_by_location(city: str, state: Optional[str] = None, coun
     
     params = {
         "city": city,
-        "stateCode": state,
         "countryCode": country,
-        "size": size,
+        "size": clamp_size(size),
         "sort": "date,asc"
     }
-    
-    # Remove None values
-    params = {k: v for k, v in params.items() if v is not None}
+    if state:
+        params["stateCode"] = state
     
     data = await make_ticketmaster_request("events.json", params)
     
@@ -275,17 +319,15 @@ async def search_events_by_genre(genre: str, city: Optional[str] = None, size: i
     Args:
         genre: Genre name (e.g., rock, pop, sports)
         city: City name for location filtering (optional)
-        size: Number of results to return (default: 5)
+        size: Number of results to return (default: 5; capped at the server maximum, 20 unless configured)
     """
     params = {
         "classificationName": genre,
-        "city": city,
-        "size": size,
+        "size": clamp_size(size),
         "sort": "date,asc"
     }
-    
-    # Remove None values
-    params = {k: v for k, v in params.items() if v is not None}
+    if city:
+        params["city"] = city
     
     data = await make_ticketmaster_request("events.json", params)
     
@@ -303,6 +345,67 @@ async def search_events_by_genre(genre: str, city: Optional[str] = None, size: i
     location_info = f" in {city}" if city else ""
     return f"Upcoming {genre} events{location_info}:\n\n" + "\n".join(formatted_events)
 
+@mcp.tool()
+async def search_events_multi(queries: List[Dict[str, Optional[str]]], size: int = 5) -> str:
+    """Search for upcoming events across several city/genre combinations at once.
+
+    Args:
+        queries: List of searches, each with a "city", a "genre", or both (e.g., [{"city": "Austin", "genre": "rock"}])
+        size: Number of results to return per search (default: 5; capped at the server maximum, 20 unless configured)
+    """
+    # Drop duplicate searches so each distinct query is only requested once, and
+    # skip ones with neither filter, which would return the entire catalog
+    searches = list(dict.fromkeys(
+        (query.get("city"), query.get("genre"))
+        for query in queries
+        if query.get("city") or query.get("genre")
+    ))
+    
+    if not searches:
+        return "No searches provided; each search needs a city, a genre, or both"
+    
+    size = clamp_size(size)
+    requests = []
+    for city, genre in searches:
+        params = {
+            "size": size,
+            "sort": "date,asc"
+        }
+        if genre:
+            params["classificationName"] = genre
+        if city:
+            params["city"] = city
+        
+        requests.append(make_ticketmaster_request("events.json", params))
+    
+    # Issue all searches concurrently over the shared client
+    results = await asyncio.gather(*requests, return_exceptions=True)
+    
+    sections = []
+    for (city, genre), data in zip(searches, results):
+        description = f"{genre} events" if genre else "events"
+        location_info = f" in {city}" if city else ""
+        
+        if isinstance(data, BaseException):
+            sections.append(f"Error searching {description}{location_info}: {str(data)}")
+            continue
+        
+        if "error" in data:
+            sections.append(f"Error searching {description}{location_info}: {data['error']}")
+            continue
+        
+        events = extract_events(data)
+        
+        if not events:
+            sections.append(f"No upcoming {description} found{location_info}")
+            continue
+        
+        formatted_events = [format_event(event) for event in events]
+        
+        sections.append(f"Upcoming {description}{location_info}:\n\n" + "\n".join(formatted_events))
+    
+    return "\n\n".join(sections)
+
 @mcp.tool()
 async def check_ticket_availability(event_id: str) -> str:
     """Check ticket availability for a specific event.
@@ -317,47 +420,43 @@ async def check_ticket_availability(event_id: str) -> str:
     if "error" in data:
         return f"Error: {data['error']}"
     
+    # Only the status, first price range, link and name are needed here
+    status = (data.get("dates") or {}).get("status") or {}
+    price_ranges = data.get("priceRanges") or ()
+    
     # Get ticket status
-    ticket_status = "Unknown"
-    if "dates" in data and "status" in data["dates"]:
-        status = data["dates"]["status"]
-        status_code = status.get("code", "")
-        if status_code == "onsale":
-            ticket_status = "On Sale"
-        elif status_code == "offsale":
-            ticket_status = "Off Sale"
-        elif status_code == "cancelled":
-            ticket_status = "Cancelled"
-        elif status_code == "postponed":
-            ticket_status = "Postponed"
-        elif status_code == "rescheduled":
-            ticket_status = "Rescheduled"
+    ticket_status = _STATUS_LABELS.get(status.get("code", ""), "Unknown")
     
     # Get ticket price range
     price_info = "Price information not available"
-    if "priceRanges" in data:
-        price_ranges = data["priceRanges"]
-        if price_ranges and len(price_ranges) > 0:
-            min_price = price_ranges[0].get("min")
-            max_price = price_ranges[0].get("max")
-            currency = price_ranges[0].get("currency", "USD")
-            if min_price and max_price:
-                price_info = f"Price Range: {min_price}-{max_price} {currency}"
-            elif min_price:
-                price_info = f"Starting Price: {min_price} {currency}"
+    if price_ranges:
+        price_range = price_ranges[0]
+        min_price = price_range.get("min")
+        max_price = price_range.get("max")
+        currency = price_range.get("currency", "USD")
+        if min_price and max_price:
+            price_info = f"Price Range: {min_price}-{max_price} {currency}"
+        elif min_price:
+            price_info = f"Starting Price: {min_price} {currency}"
     
     # Get ticket link
     ticket_link = data.get("url", "No ticket link available")
     
     event_name = data.get("name", "Unknown Event")
     
-    return f"""
-Ticket Availability for: {event_name}
-Status: {ticket_status}
-{price_info}
-Ticket Link: {ticket_link}
-"""
+    return (
+        f"\nTicket Availability for: {event_name}\n"
+        f"Status: {ticket_status}\n"
+        f"{price_info}\n"
+        f"Ticket Link: {ticket_link}\n"
+    )
 
 # Run the server
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
+    # Use uvloop's faster event loop when it is installed (not available on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        mcp.run(transport='stdio')
+    else:
+        uvloop.run(mcp.run_stdio_async())